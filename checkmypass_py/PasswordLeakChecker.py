@@ -1,12 +1,23 @@
 import requests
-import hashlib
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox, filedialog
-import aiohttp
+from tkinter import ttk, messagebox, filedialog
 import asyncio
+import os
+import queue
+import threading
 from datetime import datetime
+from audit_history import AuditHistory
+from bulk_audit import read_wordlist
+from engine import PasswordCheckEngine, password_strength
+from metrics import METRICS
+from results_view import ResultsView
 
 class PasswordCheckerApp:
+    UI_POLL_MS = 20
+    RENDER_MS = 50
+    METRICS_MS = 1000
+    LIVE_DEBOUNCE_MS = 300
+
     def __init__(self, root):
         self.root = root
         self.root.title("Password Leak Checker")
@@ -61,6 +72,16 @@ class PasswordCheckerApp:
                                       command=self.export_history)
         self.export_button.grid(row=0, column=4, padx=5)
         
+        self.bulk_button = ttk.Button(self.controls_frame, text="BULK",
+                                    command=self.check_bulk)
+        self.bulk_button.grid(row=0, column=5, padx=5)
+        
+        self.live_var = tk.BooleanVar(value=False)
+        self.live_check = ttk.Checkbutton(self.controls_frame, text="LIVE",
+                                        variable=self.live_var,
+                                        command=self.toggle_live)
+        self.live_check.grid(row=0, column=6, padx=5)
+        
         # Strength meter
         self.strength_label = ttk.Label(self.main_frame, text="STRENGTH", anchor='center')
         self.strength_label.grid(row=3, column=0, pady=(10, 5), padx=5)  # Removed sticky=tk.W for center alignment
@@ -69,11 +90,11 @@ class PasswordCheckerApp:
         self.strength_meter.grid(row=4, column=0, pady=5, padx=5, sticky=tk.EW)
         
         # Results
-        self.results_text = scrolledtext.ScrolledText(self.main_frame, width=50,
-                                                    height=10, bg=self.entry_bg,
-                                                    fg=self.text_fg, font=('Orbitron', 9, 'bold'),
-                                                    wrap=tk.WORD, borderwidth=0, relief='flat')
-        self.results_text.grid(row=5, column=0, pady=10, padx=5)
+        self.results_view = ResultsView(self.main_frame, width=50,
+                                        height=10, bg=self.entry_bg,
+                                        fg=self.text_fg, font=('Orbitron', 9, 'bold'),
+                                        borderwidth=0, relief='flat')
+        self.results_view.grid(row=5, column=0, pady=10, padx=5)
         
         # Status bar
         self.status_var = tk.StringVar()
@@ -81,26 +102,83 @@ class PasswordCheckerApp:
         self.status_bar.grid(row=6, column=0, pady=5, sticky=tk.EW)
         
         # History
-        self.history = []
+        self.history = AuditHistory()
         self.show_history_var = tk.BooleanVar()
         self.history_check = ttk.Checkbutton(self.main_frame, text="HISTORY",
                                            variable=self.show_history_var,
                                            command=self.toggle_history)
         self.history_check.grid(row=7, column=0, pady=5)
         
+        # Metrics (only with CHECKMYPASS_METRICS set)
+        self.metrics_var = tk.StringVar()
+        self.metrics_bar = ttk.Label(self.main_frame, textvariable=self.metrics_var)
+        if METRICS.enabled:
+            self.metrics_bar.grid(row=8, column=0, pady=5, sticky=tk.EW)
+        
         # Apply styles
         self.update_styles()
         
         # Bindings
         self.root.bind('<Return>', lambda e: self.check_password())
         self.root.bind('<Escape>', lambda e: self.clear_input())
+        self.password_entry.bind('<KeyRelease>', self.on_password_changed)
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         
         # Window geometry
         self.root.geometry(f"600x500+{int(self.root.winfo_screenwidth()/2-300)}+{int(self.root.winfo_screenheight()/2-250)}")
         
-        # Asyncio setup
-        self.loop = asyncio.get_event_loop()
+        # Asyncio setup: the loop runs on its own thread and hands UI work
+        # back through a queue that the Tk thread drains
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self.loop.run_forever, name="asyncio", daemon=True)
+        self.loop_thread.start()
+        self.ui_queue = queue.Queue()
+        self.root.after(self.UI_POLL_MS, self.process_ui_queue)
+        self.result_queue = queue.Queue()
+        self.root.after(self.RENDER_MS, self.render_results)
+        if METRICS.enabled:
+            self.root.after(self.METRICS_MS, self.update_metrics)
+        self.engine = PasswordCheckEngine(workers=os.cpu_count() or 1)
+        self.check_future = None
+        self.live_future = None
+        self.live_after = None
+        self.live_password = None
+
+    def run_async(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_in_ui(self, callback):
+        self.ui_queue.put(callback)
+
+    def process_ui_queue(self):
+        try:
+            while True:
+                self.ui_queue.get_nowait()()
+        except queue.Empty:
+            pass
+        self.root.after(self.UI_POLL_MS, self.process_ui_queue)
+
+    def post_result(self, text):
+        # Results from any thread are coalesced and drawn in one batch per frame
+        self.result_queue.put(text)
+
+    def render_results(self):
+        rows = []
+        try:
+            while True:
+                rows.extend(self.result_queue.get_nowait().split("\n"))
+        except queue.Empty:
+            pass
+        if rows:
+            started = METRICS.clock()
+            self.results_view.extend(rows)
+            self.results_view.render()
+            METRICS.since('render', started)
+        self.root.after(self.RENDER_MS, self.render_results)
+
+    def update_metrics(self):
+        self.metrics_var.set(METRICS.summary())
+        self.root.after(self.METRICS_MS, self.update_metrics)
 
     def set_theme(self, bg, accent, entry_bg, text_fg):
         self.bg = bg
@@ -122,9 +200,11 @@ class PasswordCheckerApp:
                            troughcolor=self.entry_bg)
         self.status_bar.configure(background=self.bg, foreground=self.accent,
                                 font=('Orbitron', 9, 'bold'))
+        self.metrics_bar.configure(background=self.bg, foreground=self.text_fg,
+                                 font=('Orbitron', 8))
         self.password_entry.configure(bg=self.entry_bg, fg=self.text_fg,
                                     insertbackground=self.text_fg)
-        self.results_text.configure(bg=self.entry_bg, fg=self.text_fg)
+        self.results_view.configure(bg=self.entry_bg, fg=self.text_fg)
 
     def toggle_theme(self):
         self.is_dark_mode = self.theme_var.get()
@@ -140,34 +220,11 @@ class PasswordCheckerApp:
         else:
             self.password_entry.config(show='•')
 
-    async def request_api_data(self, query_char):
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f'https://api.pwnedpasswords.com/range/{query_char}') as res:
-                if res.status != 200:
-                    raise RuntimeError(f'Error fetching: {res.status}')
-                return await res.text()
-
-    def get_password_leaks_count(self, hashes, hash_to_check):
-        hashes = (line.split(':') for line in hashes.splitlines())
-        for h, count in hashes:
-            if h == hash_to_check:
-                return count
-        return 0
-
     def get_password_strength(self, password):
-        score = 0
-        if len(password) > 8: score += 1
-        if any(c.isupper() for c in password): score += 1
-        if any(c.islower() for c in password): score += 1
-        if any(c.isdigit() for c in password): score += 1
-        if any(c in "!@#$%^&*" for c in password): score += 1
-        return score
+        return password_strength(password)
 
     async def pwned_api_check(self, password):
-        sha1password = hashlib.sha1(password.encode('utf-8')).hexdigest().upper()
-        first5_char, tail = sha1password[:5], sha1password[5:]
-        response = await self.request_api_data(first5_char)
-        return self.get_password_leaks_count(response, tail)
+        return await self.engine.check_async(password)
 
     def show_message(self, prefix, message, color):
         self.status_var.set(f"{prefix}: {message}")
@@ -175,15 +232,76 @@ class PasswordCheckerApp:
         self.root.after(5000, lambda: self.status_var.set(""))
 
     def toggle_history(self):
-        self.results_text.delete(1.0, tk.END)
+        self.results_view.clear()
         if self.show_history_var.get():
-            self.results_text.insert(tk.END, "\n\n".join(self.history))
+            self.results_view.append("\n\n".join(self.history.latest()))
         else:
-            self.results_text.insert(tk.END, "HISTORY CLEARED")
+            self.results_view.append("HISTORY CLEARED")
+        self.results_view.render()
+
+    def toggle_live(self):
+        self.cancel_live()
+        self.live_password = None
+        if self.live_var.get():
+            self.on_password_changed()
+
+    def cancel_live(self):
+        if self.live_after is not None:
+            self.root.after_cancel(self.live_after)
+            self.live_after = None
+        if self.live_future is not None:
+            self.live_future.cancel()
+            self.live_future = None
+
+    def on_password_changed(self, event=None):
+        # Every keystroke restarts the timer, so a lookup only runs once
+        # typing pauses
+        if not self.live_var.get():
+            return
+        if self.live_after is not None:
+            self.root.after_cancel(self.live_after)
+        self.live_after = self.root.after(self.LIVE_DEBOUNCE_MS, self.check_live)
+
+    def check_live(self):
+        self.live_after = None
+        password = self.password_entry.get().strip()
+        if password == self.live_password:
+            return
+        self.live_password = password
+        # A lookup for what was typed before is no longer wanted
+        if self.live_future is not None:
+            self.live_future.cancel()
+            self.live_future = None
+        self.strength_meter['value'] = self.get_password_strength(password)
+        if len(password) < 4:
+            self.status_var.set("")
+            return
+        
+        def show(count):
+            # Drop results that a later keystroke has already superseded
+            if password != self.live_password:
+                return
+            if count:
+                self.show_message("LIVE", f"LEAKED {count} TIMES", "red")
+            else:
+                self.show_message("LIVE", "NO LEAKS DETECTED", "green")
+        
+        async def live_check():
+            try:
+                count = await self.engine.check_async(password)
+            except Exception as e:
+                self.call_in_ui(lambda e=e: self.show_message("ERROR", str(e), "red"))
+                return
+            self.call_in_ui(lambda: show(count))
+        
+        self.status_var.set("LIVE: CHECKING...")
+        self.live_future = self.run_async(live_check())
 
     def clear_input(self):
+        self.cancel_live()
+        self.live_password = None
         self.password_entry.delete(0, tk.END)
-        self.results_text.delete(1.0, tk.END)
+        self.results_view.clear()
         self.status_var.set("")
         self.strength_meter['value'] = 0
 
@@ -192,15 +310,33 @@ class PasswordCheckerApp:
             self.show_message("INFO", "NO HISTORY TO EXPORT", "orange")
             return
         filename = filedialog.asksaveasfilename(defaultextension=".txt",
-                                              filetypes=[("Text files", "*.txt")],
+                                              filetypes=[("Text files", "*.txt"), ("CSV files", "*.csv"),
+                                                         ("JSON Lines", "*.jsonl")],
                                               initialfile=f"history_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
-        if filename:
-            with open(filename, 'w') as f:
-                f.write("\n\n".join(self.history))
-            self.show_message("SUCCESS", "HISTORY EXPORTED", "green")
+        if not filename:
+            return
+        
+        # Export streams from disk on a worker thread so the UI stays live
+        def export():
+            try:
+                self.history.export(filename)
+            except Exception as e:
+                self.call_in_ui(lambda e=e: self.show_message("ERROR", str(e), "red"))
+                return
+            self.call_in_ui(lambda: self.show_message("SUCCESS", "HISTORY EXPORTED", "green"))
+        
+        self.status_var.set("EXPORTING...")
+        threading.Thread(target=export, name="export", daemon=True).start()
 
     def on_closing(self):
         if messagebox.askokcancel("EXIT", "TERMINATE PROCESS?"):
+            try:
+                self.run_async(self.engine.aclose()).result(timeout=5)
+            except Exception:
+                pass
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.loop_thread.join(timeout=5)
+            self.history.close()
             self.root.destroy()
 
     def check_password(self):
@@ -210,44 +346,74 @@ class PasswordCheckerApp:
             return
             
         self.status_var.set("PROCESSING...")
-        self.results_text.delete(1.0, tk.END)
+        self.results_view.clear()
+        show_password = self.show_password_var.get()
+        # CHECK covers what live mode would have looked up next
+        self.cancel_live()
+        self.live_password = password
+        if self.check_future is not None:
+            self.check_future.cancel()
         
         async def check_single():
             if len(password) < 4:
-                self.root.after(0, lambda: self.show_message("WARNING", f"'{password}' TOO WEAK", "orange"))
+                self.call_in_ui(lambda: self.show_message("WARNING", f"'{password}' TOO WEAK", "orange"))
                 return
                 
             try:
                 count = await self.pwned_api_check(password)
                 strength = self.get_password_strength(password)
                 
-                self.root.after(0, lambda s=strength: self.strength_meter.configure(value=s))
-                display_pass = password if self.show_password_var.get() else '[SECURED]'
-                result = f"PASSWORD: {display_pass}\n"
-                if count:
-                    result += f"LEAKED {count} TIMES - UPDATE REQUIRED\n"
-                else:
-                    result += "NO LEAKS DETECTED\n"
-                result += f"STRENGTH: {strength}/5"
+                self.call_in_ui(lambda s=strength: self.strength_meter.configure(value=s))
+                display_pass = password if show_password else '[SECURED]'
+                outcome = f"LEAKED {count} TIMES - UPDATE REQUIRED" if count else "NO LEAKS DETECTED"
+                result = f"PASSWORD: {display_pass}\n{outcome}\nSTRENGTH: {strength}/5"
+                secured = f"PASSWORD: [SECURED]\n{outcome}\nSTRENGTH: {strength}/5"
                 
-                self.root.after(0, lambda r=result: self.results_text.insert(tk.END, r + "\n"))
-                self.history.append(result)
+                self.post_result(result)
+                # The password may be on screen but never goes to disk
+                self.history.add(secured, '[SECURED]', count, strength, display=result)
             except Exception as e:
-                self.root.after(0, lambda e=e: self.show_message("ERROR", str(e), "red"))
+                self.call_in_ui(lambda e=e: self.show_message("ERROR", str(e), "red"))
             
-            self.root.after(0, lambda: self.status_var.set("PROCESS COMPLETE"))
+            self.call_in_ui(lambda: self.status_var.set("PROCESS COMPLETE"))
 
-        self.loop.create_task(check_single())
+        self.check_future = self.run_async(check_single())
+
+    def check_bulk(self):
+        filename = filedialog.askopenfilename(filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
+        if not filename:
+            return
+        
+        self.status_var.set("PROCESSING...")
+        self.results_view.clear()
+        
+        async def check_file():
+            leaked = total = distinct = 0
+            try:
+                # Duplicates are looked up once; copies is how many lines share the hash
+                entries = read_wordlist(filename, workers=self.engine.workers)
+                async for (label, copies), sha1, count in self.engine.audit(entries, dedupe_hashes=True):
+                    total += copies
+                    distinct += 1
+                    if count:
+                        leaked += copies
+                        shared = f" ({copies} LINES)" if copies > 1 else ""
+                        result = f"LINE {label}: LEAKED {count} TIMES{shared}"
+                        self.post_result(result)
+                        self.history.add(result, f"LINE {label}", count)
+                    if distinct % 100 == 0:
+                        self.call_in_ui(lambda t=total: self.status_var.set(f"PROCESSING... {t} CHECKED"))
+            except Exception as e:
+                self.call_in_ui(lambda e=e: self.show_message("ERROR", str(e), "red"))
+                return
+            
+            self.call_in_ui(lambda: self.status_var.set(f"PROCESS COMPLETE: {leaked}/{total} LEAKED"))
+
+        self.run_async(check_file())
 
 def main():
     root = tk.Tk()
     app = PasswordCheckerApp(root)
-    while True:
-        try:
-            root.update()
-            asyncio.get_event_loop().run_until_complete(asyncio.sleep(0.01))
-        except tk.TclError:
-            break
     root.mainloop()
 
 if __name__ == '__main__':
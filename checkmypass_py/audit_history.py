@@ -0,0 +1,97 @@
+import csv
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+
+FIELDS = ('checked_at', 'label', 'count', 'strength', 'text')
+
+
+class AuditHistory:
+    # Audit results for this session: the newest few in a ring buffer for
+    # display, every one appended to a private SQLite file in batches for
+    # export. The file lives only as long as the session and is deleted by
+    # close(). Only what callers pass as text and label reaches it, so they
+    # must never pass plaintext passwords there (see add()).
+    def __init__(self, memory_size=500, flush_every=500, directory=None):
+        self.recent = deque(maxlen=memory_size)
+        self.flush_every = flush_every
+        self.pending = []
+        self.count = 0
+        self.lock = threading.Lock()
+        fd, self.path = tempfile.mkstemp(prefix='checkmypass-history-', suffix='.db', dir=directory)
+        os.close(fd)
+        self.db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=OFF')
+        self.db.execute('CREATE TABLE history ('
+                        'id INTEGER PRIMARY KEY, checked_at REAL NOT NULL, '
+                        'label TEXT, count INTEGER, strength INTEGER, text TEXT NOT NULL)')
+
+    def __len__(self):
+        return self.count
+
+    def add(self, text, label=None, count=None, strength=None, display=None):
+        # Safe to call from the asyncio thread; batches are written there too.
+        # display, when given, is what the on-screen history shows instead of
+        # text; it stays in memory and is never written out.
+        with self.lock:
+            self.recent.append(text if display is None else display)
+            self.count += 1
+            self.pending.append((time.time(), label, count, strength, text))
+            if len(self.pending) >= self.flush_every:
+                self.flush_locked()
+
+    def latest(self):
+        with self.lock:
+            return list(self.recent)
+
+    def flush(self):
+        with self.lock:
+            self.flush_locked()
+
+    def flush_locked(self):
+        if self.pending:
+            self.db.execute('BEGIN')
+            self.db.executemany('INSERT INTO history (checked_at, label, count, strength, text) '
+                                'VALUES (?, ?, ?, ?, ?)', self.pending)
+            self.db.execute('COMMIT')
+            self.pending = []
+
+    def rows(self):
+        # Streams the rows oldest first over a separate connection, so an
+        # export never blocks new results being recorded
+        self.flush()
+        db = sqlite3.connect(self.path)
+        try:
+            yield from db.execute('SELECT checked_at, label, count, strength, text FROM history ORDER BY id')
+        finally:
+            db.close()
+
+    def export(self, filename):
+        # Format follows the extension: .csv, .jsonl, anything else as text
+        extension = os.path.splitext(filename)[1].lower()
+        with open(filename, 'w', newline='', encoding='utf-8') as f:
+            if extension == '.csv':
+                writer = csv.writer(f)
+                writer.writerow(FIELDS)
+                writer.writerows(self.rows())
+            elif extension == '.jsonl':
+                for row in self.rows():
+                    f.write(json.dumps(dict(zip(FIELDS, row))) + '\n')
+            else:
+                for i, row in enumerate(self.rows()):
+                    f.write(('\n\n' if i else '') + row[-1])
+
+    def close(self):
+        with self.lock:
+            self.pending = []
+            self.db.close()
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    os.remove(self.path + suffix)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,64 @@
+import os
+
+# Every backend exposes `async fetch(prefix)` returning the parsed range as
+# a RangeTable, `async lookup(prefix, suffix)` returning a single count, and
+# `async close()`. The local ones also offer `sweep(start)`, a sequential walk
+# over the sorted corpus, and `sweep_key(hash)` for comparing against it;
+# bulk_audit.merge_join() builds on them. Pick one with
+#   CHECKMYPASS_BACKEND=online[:URL]   the Pwned Passwords API (default)
+#   CHECKMYPASS_BACKEND=dump:PATH      a local sorted HASH:count dump (SHA-1 or NTLM)
+#   CHECKMYPASS_BACKEND=index:PATH     a binary index built by offline_index.py
+#   CHECKMYPASS_BACKEND=mirror:PATH    a range store filled by mirror.py
+BACKEND_ENV = 'CHECKMYPASS_BACKEND'
+# CHECKMYPASS_PREFILTER=PATH adds a bloom filter built by bloom_filter.py
+# that answers definite misses before any backend is consulted
+PREFILTER_ENV = 'CHECKMYPASS_PREFILTER'
+
+
+def open_backend(spec=None, cache=True, limit=10, rate=None, mode='sha1'):
+    spec = spec or os.environ.get(BACKEND_ENV) or 'online'
+    kind, _, target = spec.partition(':')
+    if kind == 'online':
+        # Imported here so offline use never loads aiohttp
+        from range_client import API_URL, RangeClient
+        from range_cache import RangeCache
+        return RangeClient(base_url=target or API_URL, limit=limit, rate=rate, mode=mode,
+                           cache=RangeCache() if cache else None)
+    if kind == 'dump':
+        from offline_dump import OfflineDump
+        dump = OfflineDump(target)
+        # A dump of the other hash type would answer every lookup with a
+        # miss, so it is refused like a mismatched prefilter
+        if dump.mode != mode:
+            dump.release()
+            raise ValueError(f'{target} holds {dump.mode.upper()} hashes, not {mode.upper()}; '
+                             f'use a dump of matching hashes')
+        return dump
+    if kind == 'index':
+        if mode != 'sha1':
+            raise ValueError('The binary index only holds SHA-1 hashes; use a dump: backend for NTLM')
+        from offline_index import OfflineIndex
+        return OfflineIndex(target)
+    if kind == 'mirror':
+        from mirror import MirrorBackend
+        return MirrorBackend(target, mode)
+    raise ValueError(f'Unknown backend: {spec}')
+
+
+def open_prefilter(path=None, mode='sha1'):
+    path = path or os.environ.get(PREFILTER_ENV)
+    if not path:
+        return None
+    from bloom_filter import BloomFilter
+    prefilter = BloomFilter(path)
+    check_prefilter(prefilter, mode)
+    return prefilter
+
+
+def check_prefilter(prefilter, mode):
+    # A filter of the wrong hash type would turn every lookup into a
+    # definite miss, so it is refused rather than silently used
+    if prefilter is not None and prefilter.mode != mode:
+        prefilter.close()
+        raise ValueError(f'{prefilter.path} filters {prefilter.mode.upper()} hashes, '
+                         f'not {mode.upper()}; build one from a matching corpus')
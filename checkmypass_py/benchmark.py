@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Reproducible throughput numbers: a stand-in range server with synthetic
+# bodies runs in its own process, and each scenario runs in a fresh process
+# so its peak RSS is its own. Known passwords benchmark-0, benchmark-1, ...
+# are planted in the synthetic corpus, so every run also checks its answers.
+HIT_COUNT = 1000
+# Compared against a --baseline run; higher is better only for checks/sec
+LOWER_IS_BETTER = ('p99_ms', 'peak_rss_mib')
+
+
+def planted(i):
+    return f'benchmark-{i}'
+
+
+def planted_hits(count):
+    hits = {}
+    for i in range(count):
+        digest = hashlib.sha1(planted(i).encode('utf-8')).hexdigest().upper()
+        hits.setdefault(digest[:5], {})[digest[5:]] = i + 1
+    return hits
+
+
+def workload(count, hit_ratio, seed=0):
+    # Passwords to check: every so often a planted one, the rest misses
+    rnd = random.Random(seed)
+    passwords = []
+    for i in range(count):
+        if rnd.random() < hit_ratio:
+            passwords.append(planted(rnd.randrange(HIT_COUNT)))
+        else:
+            passwords.append(f'miss-{seed}-{i}')
+    return passwords
+
+
+def expected_leaks(passwords):
+    prefix = planted(0)[:-1]
+    return sum(1 for password in passwords if password.startswith(prefix))
+
+
+def synthetic_suffixes(size, seed=0):
+    rnd = random.Random(seed)
+    return {'%035X' % rnd.getrandbits(140): rnd.randint(1, 100) for _ in range(size)}
+
+
+def synthetic_range(suffixes, planted=None):
+    lines = dict(suffixes, **planted) if planted else suffixes
+    return '\r\n'.join(f'{suffix}:{count}' for suffix, count in sorted(lines.items()))
+
+
+def serve(conn, latency, jitter, size, error_rate, seed):
+    # Stand-in for the range API, run in a child process. Each response waits
+    # latency +/- jitter, and error_rate of them are 503s with Retry-After: 0
+    # so retries are exercised without the benchmark sleeping on backoff.
+    from aiohttp import web
+
+    # Every range shares one set of random suffixes, so the server spends its
+    # time on I/O rather than generating bodies; only ranges holding planted
+    # passwords differ
+    rnd = random.Random(seed)
+    hits = planted_hits(HIT_COUNT)
+    suffixes = synthetic_suffixes(size, seed)
+    common = synthetic_range(suffixes)
+    bodies = {prefix: synthetic_range(suffixes, planted) for prefix, planted in hits.items()}
+
+    async def handle_range(request):
+        prefix = request.match_info['prefix'].upper()
+        delay = latency + rnd.uniform(-jitter, jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if rnd.random() < error_rate:
+            return web.Response(status=503, headers={'Retry-After': '0'})
+        return web.Response(text=bodies.get(prefix, common), content_type='text/plain')
+
+    async def run():
+        app = web.Application()
+        app.router.add_get('/range/{prefix}', handle_range)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        await web.SockSite(runner, sock).start()
+        conn.send(sock.getsockname()[1])
+        await asyncio.get_running_loop().run_in_executor(None, conn.recv)
+        await runner.cleanup()
+
+    asyncio.run(run())
+
+
+class StandInServer:
+    def __init__(self, latency=0.02, jitter=0.005, size=800, error_rate=0.0, seed=0):
+        self.options = (latency, jitter, size, error_rate, seed)
+        self.conn = None
+        self.process = None
+
+    def __enter__(self):
+        context = multiprocessing.get_context('spawn')
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=serve, args=(child,) + self.options, daemon=True)
+        self.process.start()
+        self.url = f'http://127.0.0.1:{self.conn.recv()}/range/'
+        return self
+
+    def __exit__(self, *exc):
+        self.conn.send(None)
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+def build_corpus(directory, size, seed=0):
+    # A sorted SHA1:count dump of random hashes plus the planted ones, and
+    # its binary index
+    from offline_index import build_index
+
+    rnd = random.Random(seed)
+    hashes = {'%040X' % rnd.getrandbits(160): rnd.randint(1, 100) for _ in range(size)}
+    for prefix, suffixes in planted_hits(HIT_COUNT).items():
+        for suffix, count in suffixes.items():
+            hashes[prefix + suffix] = count
+    dump = os.path.join(directory, 'corpus.txt')
+    with open(dump, 'w') as f:
+        for digest in sorted(hashes):
+            f.write(f'{digest}:{hashes[digest]}\n')
+    index = os.path.join(directory, 'corpus.idx')
+    build_index(dump, index)
+    return index
+
+
+def peak_rss_mib():
+    # None where it cannot be measured
+    try:
+        import resource
+    except ImportError:
+        # Windows: the peak working set, via psutil when it is installed
+        try:
+            import psutil
+        except ImportError:
+            return None
+        memory = psutil.Process().memory_info()
+        return getattr(memory, 'peak_wset', memory.rss) / (1 << 20)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+
+
+async def drive(scenario, spec, passwords, concurrency):
+    from backends import open_backend
+    from engine import PasswordCheckEngine
+    from metrics import METRICS
+
+    backend = open_backend(spec, cache=False, limit=concurrency)
+    fetch = backend.fetch
+
+    async def timed_fetch(prefix):
+        started = METRICS.clock()
+        try:
+            return await fetch(prefix)
+        finally:
+            METRICS.since('fetch', started)
+
+    backend.fetch = timed_fetch
+    engine = PasswordCheckEngine(backend, prefilter=None)
+    leaked = 0
+    try:
+        if scenario == 'single':
+            # One password at a time, the way the GUI checks them
+            for password in passwords:
+                if await engine.check_async(password):
+                    leaked += 1
+        else:
+            async for password, count in engine.check_many_async(passwords, concurrency):
+                if count:
+                    leaked += 1
+    finally:
+        await engine.aclose()
+    return leaked
+
+
+def run_scenario(scenario, spec, count, concurrency, hit_ratio, seed):
+    # Runs in a fresh worker process
+    from metrics import METRICS
+
+    passwords = workload(count, hit_ratio, seed)
+    METRICS.enable()
+    started = time.perf_counter()
+    leaked = asyncio.run(drive(scenario, spec, passwords, concurrency))
+    elapsed = time.perf_counter() - started
+    snapshot = METRICS.snapshot()
+    latency = snapshot['latency_seconds'].get('check' if scenario == 'single' else 'fetch', {})
+    counters = snapshot['counters']
+    return {
+        'scenario': scenario,
+        'checks': count,
+        'leaked': leaked,
+        'expected_leaked': expected_leaks(passwords),
+        'seconds': elapsed,
+        'checks_per_second': count / max(elapsed, 1e-9),
+        'p99_ms': latency.get('p99', 0.0) * 1000,
+        'peak_rss_mib': peak_rss_mib(),
+        'requests': counters.get('requests', 0),
+        'retries': counters.get('retries', 0),
+    }
+
+
+def run_isolated(*args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(run_scenario, *args).result()
+
+
+def compare(results, baseline, tolerance):
+    # Returns a line per metric that got worse by more than tolerance
+    previous = {row['scenario']: row for row in baseline}
+    regressions = []
+    for row in results:
+        before = previous.get(row['scenario'])
+        if before is None:
+            continue
+        for key in ('checks_per_second',) + LOWER_IS_BETTER:
+            old, new = before[key], row[key]
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > tolerance if key in LOWER_IS_BETTER else change < -tolerance
+            if worse:
+                regressions.append(f'{row["scenario"]}: {key} {old:.1f} -> {new:.1f} ({change:+.0%})')
+    return regressions
+
+
+def report(results):
+    lines = [f'{"SCENARIO":<10}{"CHECKS":>9}{"LEAKED":>9}{"CHECKS/S":>11}{"P99 MS":>9}'
+             f'{"PEAK RSS":>10}{"RETRIES":>9}']
+    for row in results:
+        ok = '' if row['leaked'] == row['expected_leaked'] else f'  WRONG (expected {row["expected_leaked"]})'
+        rss = 'n/a' if row['peak_rss_mib'] is None else f'{row["peak_rss_mib"]:.1f}MiB'
+        lines.append(f'{row["scenario"]:<10}{row["checks"]:>9}{row["leaked"]:>9}'
+                     f'{row["checks_per_second"]:>11.1f}{row["p99_ms"]:>9.2f}'
+                     f'{rss:>10}{row["retries"]:>9}{ok}')
+    return '\n'.join(lines)
+
+
+def run(args):
+    counts = {'single': args.single, 'bulk': args.bulk, 'offline': args.offline}
+    results = []
+    with tempfile.TemporaryDirectory(prefix='checkmypass-bench-') as directory:
+        if counts['single'] or counts['bulk']:
+            with StandInServer(args.latency / 1000, args.jitter / 1000, args.range_size,
+                               args.error_rate, args.seed) as server:
+                for scenario in ('single', 'bulk'):
+                    if counts[scenario]:
+                        print(f'RUNNING {scenario.upper()}...', file=sys.stderr)
+                        results.append(run_isolated(scenario, f'online:{server.url}', counts[scenario],
+                                                    args.concurrency, args.hit_ratio, args.seed))
+        if counts['offline']:
+            print(f'BUILDING {args.corpus_size} RECORD CORPUS...', file=sys.stderr)
+            index = build_corpus(directory, args.corpus_size, args.seed)
+            print('RUNNING OFFLINE...', file=sys.stderr)
+            results.append(run_isolated('offline', f'index:{index}', counts['offline'],
+                                        args.concurrency, args.hit_ratio, args.seed))
+    print(report(results))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    failed = any(row['leaked'] != row['expected_leaked'] for row in results)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the checker against a local stand-in range server '
+                                                 'and a synthetic offline corpus')
+    parser.add_argument('--single', type=int, default=200, help='passwords checked one at a time online (0 to skip)')
+    parser.add_argument('--bulk', type=int, default=20000, help='passwords in the online bulk audit (0 to skip)')
+    parser.add_argument('--offline', type=int, default=200000, help='passwords in the offline audit (0 to skip)')
+    parser.add_argument('--latency', type=float, default=20, help='stand-in server response time in ms')
+    parser.add_argument('--jitter', type=float, default=5, help='random +/- variation of the response time in ms')
+    parser.add_argument('--range-size', type=int, default=800, help='hashes in each synthetic range')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of responses that are 503s')
+    parser.add_argument('--corpus-size', type=int, default=500000, help='hashes in the synthetic offline corpus')
+    parser.add_argument('--concurrency', type=int, default=32, help='maximum ranges fetched at once')
+    parser.add_argument('--hit-ratio', type=float, default=0.1, help='fraction of checked passwords that are leaked')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the synthetic data')
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--baseline', help='results of an earlier --json run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='relative change that counts as a regression (default: %(default)s)')
+    args = parser.parse_args(argv)
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import argparse
+import math
+import mmap
+import struct
+
+from offline_index import HEADER as INDEX_HEADER, MAGIC as INDEX_MAGIC, RECORD, RECORDS_OFFSET
+
+# Layout: 8-byte magic, u64 bit count, u32 hash count, 8-byte hash mode
+# (NUL padded), then the bit array. SHA-1 and NTLM output is already
+# uniform, so bit positions come straight from the digest by double hashing
+# instead of running extra hash functions. Version 1 files have no mode
+# field and are always SHA-1.
+MAGIC = b'PWNBLM2\0'
+HEADER = struct.Struct('<8sQI8s')
+MAGIC_V1 = b'PWNBLM1\0'
+HEADER_V1 = struct.Struct('<8sQI')
+MODES = {20: 'sha1', 16: 'ntlm'}
+
+
+def positions(digest, bits, hashes):
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:16], 'little') | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+class BloomFilter:
+    # A definite "no" means the hash is not in the corpus; a "maybe" still has
+    # to be confirmed (and counted) by the real backend
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic = self.mm[:8]
+        if magic == MAGIC:
+            _, self.bits, self.hashes, mode = HEADER.unpack_from(self.mm, 0)
+            self.mode = mode.rstrip(b'\0').decode('ascii')
+            self.offset = HEADER.size
+        elif magic == MAGIC_V1:
+            _, self.bits, self.hashes = HEADER_V1.unpack_from(self.mm, 0)
+            self.mode = 'sha1'
+            self.offset = HEADER_V1.size
+        else:
+            self.close()
+            raise ValueError(f'{path} is not a bloom filter')
+
+    def may_contain(self, digest):
+        mm = self.mm
+        for pos in positions(bytes.fromhex(digest), self.bits, self.hashes):
+            if not mm[self.offset + (pos >> 3)] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+
+def corpus_digests(source):
+    # Accepts either a binary index or a sorted HASH:count text dump
+    with open(source, 'rb') as f:
+        magic, records = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+        if magic == INDEX_MAGIC:
+            f.seek(RECORDS_OFFSET)
+            for _ in range(records):
+                yield f.read(RECORD.size)[:20]
+            return
+        f.seek(0)
+        for line in f:
+            digest = line.partition(b':')[0].strip()
+            if digest:
+                yield bytes.fromhex(digest.decode('ascii'))
+
+
+def count_digests(source):
+    with open(source, 'rb') as f:
+        magic, records = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+    if magic == INDEX_MAGIC:
+        return records
+    return sum(1 for _ in corpus_digests(source))
+
+
+def corpus_mode(source):
+    # The hash type follows from the digest width of the first record
+    for digest in corpus_digests(source):
+        if len(digest) not in MODES:
+            raise ValueError(f'{source} holds neither SHA-1 nor NTLM hashes')
+        return MODES[len(digest)]
+    return 'sha1'
+
+
+def build_filter(source, target, error_rate=0.01):
+    mode = corpus_mode(source)
+    entries = max(count_digests(source), 1)
+    bits = math.ceil(-entries * math.log(error_rate) / math.log(2) ** 2)
+    bits = (bits + 7) // 8 * 8
+    hashes = max(1, round(bits / entries * math.log(2)))
+    with open(target, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, bits, hashes, mode.encode('ascii')))
+        out.truncate(HEADER.size + bits // 8)
+    # Bits are set through a writable mapping so the array never has to fit in RAM
+    with open(target, 'r+b') as out:
+        mm = mmap.mmap(out.fileno(), 0)
+        try:
+            for digest in corpus_digests(source):
+                for pos in positions(digest, bits, hashes):
+                    mm[HEADER.size + (pos >> 3)] |= 1 << (pos & 7)
+            mm.flush()
+        finally:
+            mm.close()
+    return entries, bits, hashes, mode
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build a bloom filter prefilter from the password corpus')
+    parser.add_argument('source', help='sorted SHA1:count or NTLM:count dump, or binary index')
+    parser.add_argument('target', help='filter file to write')
+    parser.add_argument('--error-rate', type=float, default=0.01, help='target false positive rate')
+    args = parser.parse_args(argv)
+    entries, bits, hashes, mode = build_filter(args.source, args.target, args.error_rate)
+    print(f'{entries} {mode.upper()} ENTRIES, {bits // 8 // 1024} KIB, {hashes} HASHES')
+
+
+if __name__ == '__main__':
+    main()
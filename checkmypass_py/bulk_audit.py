@@ -0,0 +1,258 @@
+import argparse
+import asyncio
+import os
+import sys
+from itertools import chain, islice
+from operator import itemgetter
+
+from backends import open_backend, open_prefilter
+from external_sort import external_sort
+from hash_pipeline import hash_wordlist
+from hashes import HASH_RE, HASHERS
+from metrics import METRICS
+
+# Entries held at once by audit(); bounds memory on inputs of any size
+BATCH_SIZE = 50000
+# Below this a process pool costs more to start than hashing saves
+PIPELINE_MIN_BYTES = 16 << 20
+
+
+def read_entries(path, plain=False, mode='sha1'):
+    # Yields (line number, hash hex). Lines that already look like a hash of
+    # the chosen mode are taken as-is unless plain is set.
+    hash_re, hasher = HASH_RE[mode], HASHERS[mode]
+    # newline='\n' splits lines exactly where hash_pipeline does; a lone
+    # \r is part of the line, not a line break
+    with open(path, encoding='utf-8', errors='surrogateescape', newline='\n') as f:
+        for number, line in enumerate(f, 1):
+            line = line.rstrip('\r\n')
+            if not line:
+                continue
+            if not plain and hash_re.match(line):
+                yield number, line.upper()
+            else:
+                yield number, hasher(line)
+
+
+def read_wordlist(path, plain=False, mode='sha1', workers=1):
+    # read_entries(), or for big files with workers > 1 the same stream
+    # hashed in parallel by hash_pipeline
+    if workers > 1 and os.path.getsize(path) >= PIPELINE_MIN_BYTES:
+        return hash_wordlist(path, plain, mode, workers)
+    return read_entries(path, plain, mode)
+
+
+def read_pwdump(path, skip_machines=False):
+    # Streams `user:rid:lmhash:nthash:::` lines from pwdump/secretsdump output
+    # as (user, NT hash) without ever holding the whole file
+    ntlm_re = HASH_RE['ntlm']
+    with open(path, encoding='utf-8', errors='surrogateescape') as f:
+        for line in f:
+            fields = line.rstrip('\r\n').split(':')
+            if len(fields) < 4 or not ntlm_re.match(fields[3]):
+                continue
+            user = fields[0]
+            if skip_machines and user.endswith('$'):
+                continue
+            yield user, fields[3].upper()
+
+
+def take(entries, size):
+    return list(islice(entries, size))
+
+
+async def read_batches(entries, size):
+    # Pulls the input size entries at a time on a worker thread, so reading
+    # and hashing a big file never stalls the event loop
+    loop = asyncio.get_running_loop()
+    entries = iter(entries)
+    while True:
+        batch = await loop.run_in_executor(None, take, entries, size)
+        if not batch:
+            return
+        yield batch
+
+
+def group_by_prefix(entries):
+    groups = {}
+    for label, digest in entries:
+        groups.setdefault(digest[:5], []).append((label, digest))
+    return groups
+
+
+async def audit(entries, fetch, concurrency=8, prefilter=None, batch_size=BATCH_SIZE):
+    # Fetches each distinct prefix once, at most `concurrency` at a time, and
+    # yields (label, hash, count) for every entry as its range comes back.
+    # The input is consumed in slices of batch_size entries (None for all
+    # at once), keeping memory flat for inputs of any size.
+    async for batch in read_batches(entries, batch_size):
+        async for result in audit_batch(batch, fetch, concurrency, prefilter):
+            yield result
+
+
+async def audit_batch(entries, fetch, concurrency, prefilter):
+    groups = group_by_prefix(entries)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    if prefilter is not None:
+        # Prefixes whose entries are all definite misses never need fetching
+        for prefix in list(groups):
+            members = groups[prefix]
+            if not any(prefilter.may_contain(digest) for label, digest in members):
+                del groups[prefix]
+                for label, digest in members:
+                    yield label, digest, 0
+
+    async def lookup(prefix, members):
+        async with semaphore:
+            table = await fetch(prefix)
+        return [(label, digest, table.count(digest[5:])) for label, digest in members]
+
+    tasks = [asyncio.ensure_future(lookup(prefix, members)) for prefix, members in groups.items()]
+    try:
+        for future in asyncio.as_completed(tasks):
+            for result in await future:
+                yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def dedupe(entries, run_size=1000000, directory=None):
+    # Collapses entries that share a hash into one whose label becomes
+    # (first label, copies), so every later stage does one lookup per
+    # distinct hash. Sorting is external, so memory stays bounded; output
+    # comes in hash order.
+    label = digest = None
+    copies = 0
+    for entry_label, entry_digest in external_sort(entries, itemgetter(1), run_size, directory):
+        if entry_digest != digest:
+            if copies:
+                yield (label, copies), digest
+            label, digest, copies = entry_label, entry_digest, 0
+        copies += 1
+    if copies:
+        yield (label, copies), digest
+
+
+async def merge_join(entries, backend, run_size=1000000, directory=None, batch_size=BATCH_SIZE):
+    # For inputs too big for per-entry lookups: sorts the entries by hash
+    # (spilling to disk past run_size) and walks them alongside the sorted
+    # corpus in one sequential pass. Yields (label, hash, count) in hash
+    # order. Needs a backend with sweep(), i.e. dump:, index: or mirror:.
+    # The sort and the sweep run on a worker thread, batch_size results at
+    # a time, so they never stall the event loop.
+    if not hasattr(backend, 'sweep'):
+        raise ValueError('Merge join needs a local corpus: use a dump:, index: or mirror: backend')
+    async for batch in read_batches(join_sorted(entries, backend, run_size, directory), batch_size):
+        for result in batch:
+            yield result
+
+
+def join_sorted(entries, backend, run_size, directory):
+    entries = external_sort(entries, itemgetter(1), run_size, directory)
+    first = next(entries, None)
+    if first is None:
+        return
+    # The sweep starts at the first input hash, not the top of the corpus
+    corpus = backend.sweep(first[1])
+    record = next(corpus, None)
+    key = backend.sweep_key
+    for label, digest in chain([first], entries):
+        target = key(digest)
+        while record is not None and record[0] < target:
+            record = next(corpus, None)
+        yield label, digest, record[1] if record is not None and record[0] == target else 0
+
+
+async def run(args):
+    if args.metrics:
+        METRICS.enable()
+    mode = 'ntlm' if args.pwdump else args.mode
+    backend = open_backend(args.backend, cache=not args.no_cache, limit=args.concurrency, rate=args.rate,
+                           mode=mode)
+    prefilter = open_prefilter(args.prefilter, mode)
+    if args.pwdump:
+        entries, label_name = read_pwdump(args.file, args.skip_machines), 'user'
+    else:
+        entries, label_name = read_wordlist(args.file, args.plain, mode, args.hash_workers), 'line'
+    if args.dedupe:
+        entries = dedupe(entries, args.batch_size, args.temp_dir)
+    leaked = total = unique = 0
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        out.write(f'{label_name},{mode},count' + (',copies\n' if args.dedupe else '\n'))
+        if args.merge_join:
+            results = merge_join(entries, backend, args.batch_size, args.temp_dir, args.batch_size)
+        elif args.workers > 1:
+            from sharded_audit import can_shard, sharded_audit
+            if not can_shard(backend):
+                raise ValueError('--workers needs a local corpus: use a dump: or index: backend')
+            results = sharded_audit(entries, backend, args.workers, args.shard_nibbles,
+                                    batch_size=args.batch_size)
+        else:
+            results = audit(entries, backend.fetch, args.concurrency, prefilter, args.batch_size)
+        async for label, digest, count in results:
+            # Totals count accounts (input lines), not distinct hashes
+            label, copies = label if args.dedupe else (label, 1)
+            unique += 1
+            total += copies
+            if count:
+                leaked += copies
+            METRICS.incr('checks')
+            if count or not args.leaked_only:
+                out.write(f'{label},{digest},{count},{copies}\n' if args.dedupe else f'{label},{digest},{count}\n')
+    finally:
+        await backend.close()
+        if prefilter is not None:
+            prefilter.close()
+        if out is not sys.stdout:
+            out.close()
+    print(f'{leaked}/{total} LEAKED' + (f' ({unique} DISTINCT HASHES)' if args.dedupe else ''), file=sys.stderr)
+    if args.metrics == '-':
+        print(METRICS.to_json(), file=sys.stderr)
+    elif args.metrics:
+        with open(args.metrics, 'w') as f:
+            f.write(METRICS.to_json())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check a file of passwords or hashes against Pwned Passwords')
+    parser.add_argument('file', help='one password or hash per line, or a pwdump file with --pwdump')
+    parser.add_argument('--plain', action='store_true', help='treat every line as a plaintext password')
+    parser.add_argument('--mode', choices=sorted(HASHERS), default='sha1', help='hash type to look up')
+    parser.add_argument('--pwdump', action='store_true',
+                        help='input is user:rid:lm:nt::: pwdump/secretsdump output (implies --mode ntlm)')
+    parser.add_argument('--skip-machines', action='store_true', help='ignore machine accounts (ending in $)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help='entries grouped per pass (or sorted per run with --merge-join); '
+                             'bounds memory on huge inputs')
+    parser.add_argument('--merge-join', action='store_true',
+                        help='sort the input and sweep a local corpus once instead of looking up each '
+                             'entry; results come out in hash order')
+    parser.add_argument('--hash-workers', type=int, default=1,
+                        help='processes hashing large wordlists ahead of the lookups')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='processes sharing lookups against a dump: or index: backend')
+    parser.add_argument('--shard-nibbles', type=int, default=1, choices=(1, 2),
+                        help='leading hex digits the input is partitioned on with --workers')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='look up each distinct hash once and report how many entries share it '
+                             '(first label plus a copies column); results come out in hash order')
+    parser.add_argument('--temp-dir', help='where --merge-join and --dedupe spill sorted runs '
+                                           '(default: system temp)')
+    parser.add_argument('--concurrency', type=int, default=8, help='maximum ranges fetched at once')
+    parser.add_argument('--rate', type=float, help='maximum range requests per second')
+    parser.add_argument('--output', help='write CSV results here instead of stdout')
+    parser.add_argument('--leaked-only', action='store_true', help='only report leaked entries')
+    parser.add_argument('--backend', help='online[:URL], dump:PATH, index:PATH or mirror:PATH (default: $CHECKMYPASS_BACKEND or online)')
+    parser.add_argument('--prefilter', help='bloom filter file (default: $CHECKMYPASS_PREFILTER)')
+    parser.add_argument('--metrics', help='record latency/cache/throughput metrics and write them as JSON '
+                                          'to this file (- for stderr)')
+    parser.add_argument('--no-cache', action='store_true', help='bypass the local range cache')
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
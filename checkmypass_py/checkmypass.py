@@ -0,0 +1,85 @@
+import argparse
+import getpass
+import importlib
+import sys
+
+# Headless entry point: python -m checkmypass <command> ...
+# Tools are imported only when their command runs, and nothing here pulls in
+# tkinter, so it starts quickly on servers without a display.
+TOOLS = {
+    'audit': ('bulk_audit', 'check a file of passwords or SHA-1 hashes'),
+    'index': ('offline_index', 'convert a SHA1:count dump into a binary index'),
+    'bloom': ('bloom_filter', 'build a bloom filter prefilter from the corpus'),
+    'mirror': ('mirror', 'download every range into a local store, resuming where it stopped'),
+    'serve': ('range_proxy', 'serve a Pwned Passwords compatible range API from the local cache'),
+    'bench': ('benchmark', 'measure throughput against a local stand-in server and synthetic corpus'),
+}
+
+
+def read_passwords(args):
+    if args.passwords == ['-']:
+        for line in sys.stdin:
+            line = line.rstrip('\r\n')
+            if line:
+                yield line
+    elif args.passwords:
+        yield from args.passwords
+    else:
+        yield getpass.getpass('PASSWORD: ')
+
+
+def check_main(argv):
+    parser = argparse.ArgumentParser(prog='checkmypass check',
+                                     description='Check passwords against Pwned Passwords')
+    parser.add_argument('passwords', nargs='*', help='passwords to check, - to read them from stdin '
+                                                     '(prompts when omitted)')
+    parser.add_argument('--backend', help='online[:URL], dump:PATH, index:PATH or mirror:PATH (default: $CHECKMYPASS_BACKEND or online)')
+    parser.add_argument('--prefilter', help='bloom filter file (default: $CHECKMYPASS_PREFILTER)')
+    parser.add_argument('--concurrency', type=int, default=8, help='maximum ranges fetched at once')
+    parser.add_argument('--mode', choices=('sha1', 'ntlm'), default='sha1', help='hash type to look up')
+    parser.add_argument('--show', action='store_true', help='label results with the passwords themselves '
+                                                            'instead of their position (they end up in logs)')
+    args = parser.parse_args(argv)
+
+    from backends import open_backend, open_prefilter
+    from engine import PasswordCheckEngine
+
+    leaked = 0
+    with PasswordCheckEngine(open_backend(args.backend, limit=args.concurrency, mode=args.mode),
+                             open_prefilter(args.prefilter, args.mode), args.mode) as engine:
+        passwords = list(read_passwords(args))
+        # Results come back grouped by range, so each is labelled with its
+        # input position; plaintext is only printed when asked for
+        positions = {}
+        for number, password in enumerate(passwords, 1):
+            positions.setdefault(password, []).append(number)
+        for password, count in engine.check_many(passwords, args.concurrency):
+            label = password if args.show else positions[password].pop(0)
+            prefix = f'{label}: ' if len(passwords) > 1 else ''
+            if count:
+                leaked += 1
+                print(f'{prefix}LEAKED {count} TIMES')
+            else:
+                print(f'{prefix}NO LEAKS DETECTED')
+    return 1 if leaked else 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    commands = '\n'.join(f'  {name:<8}{help}' for name, (_, help) in TOOLS.items())
+    usage = ('usage: python -m checkmypass <command> [args]\n\n'
+             f'commands:\n  check   check passwords given as arguments or on stdin\n{commands}')
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage)
+        return 0
+    command, rest = argv[0], argv[1:]
+    if command == 'check':
+        return check_main(rest)
+    if command not in TOOLS:
+        print(usage, file=sys.stderr)
+        return 2
+    return importlib.import_module(TOOLS[command][0]).main(rest) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import asyncio
+
+from backends import check_prefilter, open_backend, open_prefilter
+from bulk_audit import BATCH_SIZE, audit, dedupe
+from hashes import HASHERS
+from metrics import METRICS
+from sharded_audit import can_shard, sharded_audit
+
+
+def password_strength(password):
+    score = 0
+    if len(password) > 8: score += 1
+    if any(c.isupper() for c in password): score += 1
+    if any(c.islower() for c in password): score += 1
+    if any(c.isdigit() for c in password): score += 1
+    if any(c in "!@#$%^&*" for c in password): score += 1
+    return score
+
+
+class PasswordCheckEngine:
+    # Headless checker shared by the GUI and the CLI. Use either the async
+    # API from your own event loop or the sync wrappers, which drive a
+    # private loop, but not both on the same instance. With workers > 1,
+    # audits against a local dump or index run on a process pool.
+    def __init__(self, backend=None, prefilter=None, mode='sha1', workers=1):
+        self.mode = mode
+        self.workers = workers
+        self.hasher = HASHERS[mode]
+        self.backend = backend if backend is not None else open_backend(mode=mode)
+        if prefilter is None:
+            prefilter = open_prefilter(mode=mode)
+        check_prefilter(prefilter, mode)
+        self.prefilter = prefilter
+        self.loop = None
+
+    async def check_hash_async(self, digest):
+        started = METRICS.clock()
+        METRICS.incr('checks')
+        digest = digest.upper()
+        try:
+            if self.prefilter is not None and not self.prefilter.may_contain(digest):
+                METRICS.incr('prefilter_misses')
+                return 0
+            return await self.backend.lookup(digest[:5], digest[5:])
+        finally:
+            METRICS.since('check', started)
+
+    async def check_async(self, password):
+        started = METRICS.clock()
+        digest = self.hasher(password)
+        METRICS.since('hash', started)
+        return await self.check_hash_async(digest)
+
+    async def audit(self, entries, concurrency=8, batch_size=BATCH_SIZE, dedupe_hashes=False):
+        # entries are (label, hash hex) pairs; yields (label, hash, count).
+        # With dedupe_hashes each distinct hash is looked up once and its
+        # label becomes (first label, copies); results come in hash order.
+        if dedupe_hashes:
+            entries = dedupe(entries, batch_size or BATCH_SIZE)
+        if self.workers > 1 and can_shard(self.backend):
+            results = sharded_audit(entries, self.backend, self.workers, batch_size=batch_size or BATCH_SIZE)
+        else:
+            results = audit(entries, self.backend.fetch, concurrency, self.prefilter, batch_size)
+        async for result in results:
+            METRICS.incr('checks')
+            yield result
+
+    async def check_many_async(self, passwords, concurrency=8, batch_size=BATCH_SIZE):
+        entries = ((password, self.hasher(password)) for password in passwords)
+        async for password, digest, count in self.audit(entries, concurrency, batch_size):
+            yield password, count
+
+    async def aclose(self):
+        await self.backend.close()
+        if self.prefilter is not None:
+            self.prefilter.close()
+
+    def run(self, coro):
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+        return self.loop.run_until_complete(coro)
+
+    def check(self, password):
+        return self.run(self.check_async(password))
+
+    def check_hash(self, digest):
+        return self.run(self.check_hash_async(digest))
+
+    def check_many(self, passwords, concurrency=8):
+        results = self.check_many_async(passwords, concurrency)
+        try:
+            while True:
+                try:
+                    yield self.run(results.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.run(results.aclose())
+
+    def close(self):
+        self.run(self.aclose())
+        self.loop.close()
+        self.loop = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
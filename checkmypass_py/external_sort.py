@@ -0,0 +1,46 @@
+import heapq
+import pickle
+import tempfile
+from itertools import islice
+
+BLOCK_SIZE = 4096
+
+
+def spill(run, directory=None):
+    # Sorted run to an anonymous temp file, pickled in blocks so a record
+    # costs a fraction of a pickle call each way
+    f = tempfile.TemporaryFile(dir=directory)
+    for start in range(0, len(run), BLOCK_SIZE):
+        pickle.dump(run[start:start + BLOCK_SIZE], f, pickle.HIGHEST_PROTOCOL)
+    f.seek(0)
+    return f
+
+
+def read_run(f):
+    unpickler = pickle.Unpickler(f)
+    while True:
+        try:
+            block = unpickler.load()
+        except EOFError:
+            return
+        yield from block
+
+
+def external_sort(items, key=None, run_size=1000000, directory=None):
+    # Sorts any number of items holding at most run_size in memory: full
+    # runs are sorted and spilled to temp files, then merged back in one
+    # streaming pass. Input that fits in a single run never touches disk.
+    items = iter(items)
+    run = sorted(islice(items, run_size), key=key)
+    if len(run) < run_size:
+        yield from run
+        return
+    runs = []
+    try:
+        while run:
+            runs.append(spill(run, directory))
+            run = sorted(islice(items, run_size), key=key)
+        yield from heapq.merge(*(read_run(f) for f in runs), key=key)
+    finally:
+        for f in runs:
+            f.close()
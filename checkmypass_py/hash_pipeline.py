@@ -0,0 +1,83 @@
+import hashlib
+import multiprocessing
+import os
+import re
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from hashes import HASH_RE, HASHERS
+
+CHUNK_SIZE = 1 << 22
+WIDTHS = {'sha1': 40, 'ntlm': 32}
+HASH_BYTES_RE = {mode: re.compile(pattern.pattern.encode('ascii')) for mode, pattern in HASH_RE.items()}
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    # Yields (number of the first line, bytes) in chunks that end on a line
+    # boundary, without decoding anything
+    number = 1
+    with open(path, 'rb') as f:
+        tail = b''
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            end = block.rfind(b'\n') + 1
+            if not end:
+                tail += block
+                continue
+            chunk, tail = tail + block[:end], block[end:]
+            yield number, chunk
+            number += chunk.count(b'\n')
+        if tail:
+            yield number, tail
+
+
+def hash_chunk(number, chunk, mode='sha1', plain=False):
+    # Runs in a worker. SHA-1 hashes the raw line bytes, which is the same
+    # as hashing the decoded password re-encoded as UTF-8, so lines are never
+    # decoded. Returns the line numbers as an array and the digests as one
+    # string so the result pickles as two objects, not a million.
+    hash_re = HASH_BYTES_RE[mode]
+    numbers = array('Q')
+    digests = []
+    for line in chunk.split(b'\n'):
+        line = line.rstrip(b'\r')
+        if line:
+            numbers.append(number)
+            if not plain and hash_re.match(line):
+                digests.append(line.decode('ascii').upper())
+            elif mode == 'sha1':
+                digests.append(hashlib.sha1(line).hexdigest().upper())
+            else:
+                digests.append(HASHERS[mode](line.decode('utf-8', 'surrogateescape')))
+        number += 1
+    return numbers, ''.join(digests)
+
+
+def hash_wordlist(path, plain=False, mode='sha1', workers=None, chunk_size=CHUNK_SIZE):
+    # Same (line number, hash hex) stream as bulk_audit.read_entries(), with
+    # the file read in large chunks and the hashing spread over worker
+    # processes. At most two chunks per worker are in flight, so memory
+    # stays bounded and the lookups downstream set the pace.
+    workers = workers or os.cpu_count()
+    width = WIDTHS[mode]
+    pending = deque()
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        try:
+            for number, chunk in read_chunks(path, chunk_size):
+                pending.append(pool.submit(hash_chunk, number, chunk, mode, plain))
+                if len(pending) >= 2 * workers:
+                    yield from unpack(pending.popleft().result(), width)
+            while pending:
+                yield from unpack(pending.popleft().result(), width)
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def unpack(result, width):
+    numbers, digests = result
+    for i, number in enumerate(numbers):
+        yield number, digests[i * width:(i + 1) * width]
@@ -0,0 +1,25 @@
+import hashlib
+import re
+
+# The range API and offline corpora come in two flavours: SHA-1 (default)
+# and NTLM (`?mode=ntlm`), which is what Active Directory dumps contain
+HASH_RE = {
+    'sha1': re.compile(r'^[0-9A-Fa-f]{40}$'),
+    'ntlm': re.compile(r'^[0-9A-Fa-f]{32}$'),
+}
+
+
+def sha1_hex(password):
+    return hashlib.sha1(password.encode('utf-8', 'surrogateescape')).hexdigest().upper()
+
+
+def ntlm_hex(password):
+    try:
+        md4 = hashlib.new('md4')
+    except ValueError:
+        raise ValueError('MD4 is unavailable in this Python build; supply NT hashes instead of plaintext') from None
+    md4.update(password.encode('utf-16-le', 'surrogatepass'))
+    return md4.hexdigest().upper()
+
+
+HASHERS = {'sha1': sha1_hex, 'ntlm': ntlm_hex}
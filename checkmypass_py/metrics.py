@@ -0,0 +1,128 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+# Latency buckets grow by 25% from 10us to ~100s, so quantiles read back
+# within about 12% of the true value from a fixed 73-slot array
+BOUNDS = [1e-5 * 1.25 ** i for i in range(73)]
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return BOUNDS[min(i, len(BOUNDS) - 1)]
+        return BOUNDS[-1]
+
+
+class Metrics:
+    # Process-wide instrumentation. Disabled by default; every hook starts
+    # with an attribute check so the cost when off is a function call.
+    # Enable with CHECKMYPASS_METRICS=1 or metrics.METRICS.enable().
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+            self.started = time.monotonic()
+
+    def enable(self):
+        self.enabled = True
+        self.reset()
+
+    def clock(self):
+        return time.perf_counter() if self.enabled else 0.0
+
+    def since(self, name, started):
+        if self.enabled:
+            self.observe(name, time.perf_counter() - started)
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def incr(self, name, amount=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def hit_ratio(self):
+        hits = self.counters.get('cache_hits', 0)
+        lookups = hits + self.counters.get('cache_misses', 0)
+        return hits / lookups if lookups else 0.0
+
+    def checks_per_second(self):
+        return self.counters.get('checks', 0) / max(time.monotonic() - self.started, 1e-9)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'uptime_seconds': time.monotonic() - self.started,
+                'checks_per_second': self.checks_per_second(),
+                'cache_hit_ratio': self.hit_ratio(),
+                'counters': dict(self.counters),
+                'latency_seconds': {
+                    name: dict({f'p{int(q * 100)}': h.quantile(q) for q in QUANTILES},
+                               count=h.count, sum=h.total)
+                    for name, h in self.histograms.items()
+                },
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'# TYPE checkmypass_{name}_total counter')
+            lines.append(f'checkmypass_{name}_total {value}')
+        for name in ('checks_per_second', 'cache_hit_ratio'):
+            lines.append(f'# TYPE checkmypass_{name} gauge')
+            lines.append(f'checkmypass_{name} {snapshot[name]:.6g}')
+        for name, stats in sorted(snapshot['latency_seconds'].items()):
+            lines.append(f'# TYPE checkmypass_{name}_seconds summary')
+            for q in QUANTILES:
+                lines.append(f'checkmypass_{name}_seconds{{quantile="{q}"}} {stats[f"p{int(q * 100)}"]:.6g}')
+            lines.append(f'checkmypass_{name}_seconds_sum {stats["sum"]:.6g}')
+            lines.append(f'checkmypass_{name}_seconds_count {stats["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        # One line for the GUI status bar
+        check = self.histograms.get('check')
+        latency = (f'P50 {check.quantile(0.5) * 1000:.0f}MS P95 {check.quantile(0.95) * 1000:.0f}MS '
+                   f'P99 {check.quantile(0.99) * 1000:.0f}MS | ') if check else ''
+        return (f'{latency}CACHE {self.hit_ratio():.0%} | '
+                f'{self.checks_per_second():.1f} CHECKS/S | '
+                f'{self.counters.get("bytes", 0) // 1024} KIB')
+
+
+METRICS = Metrics(enabled=os.environ.get('CHECKMYPASS_METRICS', '') not in ('', '0'))
@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from itertools import islice
+
+from range_cache import RangeCache
+from range_table import RangeTable
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.checkmypass', 'mirror.db')
+PREFIX_COUNT = 16 ** 5
+
+
+def all_prefixes():
+    for i in range(PREFIX_COUNT):
+        yield f'{i:05X}'
+
+
+def open_store(path):
+    # A RangeCache with no expiry and no size cap doubles as the mirror store.
+    # Each range is committed as soon as it arrives, which is also the
+    # checkpoint: a rerun skips every prefix already stored recently enough.
+    return RangeCache(path, ttl=None, memory_size=64, max_entries=None)
+
+
+async def mirror(store, client, concurrency=64, max_age=None, progress=None):
+    done = store.fresh_keys(max_age)
+    remaining = sum(1 for prefix in all_prefixes() if client.cache_key(prefix) not in done)
+    todo = (prefix for prefix in all_prefixes() if client.cache_key(prefix) not in done)
+    fetched = 0
+
+    async def worker():
+        nonlocal fetched
+        # Workers pull from one shared generator, so only `concurrency`
+        # requests exist at a time rather than a million queued tasks
+        for prefix in todo:
+            # Ranges already in the store are revalidated, so an unchanged
+            # range costs a header-only 304 instead of a full body
+            key = client.cache_key(prefix)
+            status, body, etag, last_modified = await client.download_conditional(
+                prefix, *(store.validators(key) or ()))
+            if status == 304:
+                store.touch(key)
+            else:
+                store.put_body(key, body, etag, last_modified)
+            fetched += 1
+            if progress is not None:
+                progress(fetched, remaining)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+    return fetched
+
+
+def export_dump(store, path, mode='sha1'):
+    # Writes the mirror as a sorted HASH:count dump, ready for the dump:
+    # backend; a SHA-1 export can also go through offline_index.py
+    key = (lambda prefix: prefix) if mode == 'sha1' else (lambda prefix: f'{mode}:{prefix}')
+    missing = 0
+    with open(path, 'w', newline='\n') as out:
+        for prefix in all_prefixes():
+            body = store.get_body(key(prefix))
+            if body is None:
+                missing += 1
+                continue
+            for suffix, count in RangeTable.parse(body).items():
+                out.write(f'{prefix}{suffix}:{count}\n')
+    return missing
+
+
+class MirrorBackend:
+    # Serves lookups straight from a mirror store, e.g. CHECKMYPASS_BACKEND=mirror:PATH
+    def __init__(self, path, mode='sha1'):
+        self.store = open_store(path)
+        self.mode = mode
+
+    def store_key(self, query_char):
+        return query_char if self.mode == 'sha1' else f'{self.mode}:{query_char}'
+
+    def sweep_key(self, digest):
+        return digest.upper()
+
+    def sweep(self, start=None):
+        # Every (hash, count) from start's range to the last one, in order
+        first = int(start[:5], 16) if start else 0
+        for prefix in islice(all_prefixes(), first, None):
+            body = self.store.get_body(self.store_key(prefix))
+            if body is None:
+                raise RuntimeError(f'Range {prefix} is not mirrored')
+            for suffix, count in RangeTable.parse(body).items():
+                yield prefix + suffix, count
+
+    async def fetch(self, query_char):
+        table = self.store.get(self.store_key(query_char), stale=True)
+        if table is None:
+            raise RuntimeError(f'Range {query_char} is not mirrored')
+        return table
+
+    async def lookup(self, query_char, suffix):
+        table = await self.fetch(query_char)
+        return table.count(suffix)
+
+    async def close(self):
+        self.store.close()
+
+
+async def run(args):
+    from range_client import API_URL, RangeClient
+
+    store = open_store(args.path)
+    client = RangeClient(base_url=args.api_url or API_URL, limit=args.concurrency, rate=args.rate,
+                         mode=args.mode)
+    started = time.monotonic()
+
+    def progress(fetched, remaining):
+        if fetched % 1000 == 0 or fetched == remaining:
+            rate = fetched / max(time.monotonic() - started, 1e-9)
+            print(f'{fetched}/{remaining} RANGES ({rate:.0f}/s)', file=sys.stderr)
+
+    try:
+        max_age = args.max_age_days * 86400 if args.max_age_days is not None else None
+        fetched = await mirror(store, client, args.concurrency, max_age, progress)
+        print(f'{fetched} RANGES FETCHED', file=sys.stderr)
+        if args.export:
+            missing = export_dump(store, args.export, args.mode)
+            print(f'EXPORTED TO {args.export}' + (f' ({missing} RANGES MISSING)' if missing else ''),
+                  file=sys.stderr)
+    finally:
+        await client.close()
+        store.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mirror every Pwned Passwords range into a local store')
+    parser.add_argument('path', nargs='?', default=DEFAULT_PATH, help='mirror database (default: %(default)s)')
+    parser.add_argument('--concurrency', type=int, default=64, help='maximum ranges fetched at once')
+    parser.add_argument('--rate', type=float, help='maximum range requests per second')
+    parser.add_argument('--max-age-days', type=float, default=7,
+                        help='ranges stored more recently than this are not fetched again')
+    parser.add_argument('--mode', choices=('sha1', 'ntlm'), default='sha1', help='hash type to mirror; only a SHA-1 export can be indexed by offline_index.py')
+    parser.add_argument('--api-url', help='range API base URL')
+    parser.add_argument('--export', help='also write the mirror as a sorted HASH:count dump')
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import mmap
+import os
+
+from range_table import RangeTable
+
+# Hash type by the hex width of a dump's digests
+MODES = {40: 'sha1', 32: 'ntlm'}
+
+
+def advise_sequential(f, offset=0):
+    # Hint the kernel to read ahead aggressively for a front-to-back sweep
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(f.fileno(), offset, 0, os.POSIX_FADV_SEQUENTIAL)
+
+
+class OfflineDump:
+    # Answers range lookups from a local copy of the sorted `SHA1:count`
+    # (or `NTLM:count`) Pwned Passwords download. The file is memory-mapped
+    # and searched in place, so only the pages a lookup touches are ever read.
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = len(self.mm)
+        self.mode = self.corpus_mode()
+        if self.mode is None:
+            self.release()
+            raise ValueError(f'{path} holds neither SHA-1 nor NTLM hashes')
+
+    def corpus_mode(self):
+        # The hash type follows from the digest width of the first record
+        offset = 0
+        while offset < self.size:
+            end = self.mm.find(b'\n', offset)
+            if end == -1:
+                end = self.size
+            digest = self.mm[offset:end].partition(b':')[0].strip()
+            if digest:
+                return MODES.get(len(digest))
+            offset = end + 1
+        return 'sha1'
+
+    def lower_bound(self, key):
+        # Offset of the first line whose leading bytes are >= key
+        mm = self.mm
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mm.rfind(b'\n', 0, mid) + 1
+            if mm[start:start + len(key)] < key:
+                end = mm.find(b'\n', start)
+                lo = self.size if end == -1 else end + 1
+            else:
+                hi = start
+        return lo
+
+    def lines_from(self, offset, prefix):
+        mm = self.mm
+        while offset < self.size and mm[offset:offset + len(prefix)] == prefix:
+            end = mm.find(b'\n', offset)
+            if end == -1:
+                end = self.size
+            yield mm[offset:end].rstrip(b'\r')
+            offset = end + 1
+
+    def range_pairs(self, prefix):
+        prefix = prefix.upper().encode('ascii')
+        for line in self.lines_from(self.lower_bound(prefix), prefix):
+            suffix, _, count = line[len(prefix):].partition(b':')
+            yield suffix.decode('ascii'), int(count)
+
+    def count(self, sha1):
+        sha1 = sha1.upper().encode('ascii')
+        for line in self.lines_from(self.lower_bound(sha1), sha1):
+            return int(line.partition(b':')[2])
+        return 0
+
+    def sweep_key(self, digest):
+        return digest.upper().encode('ascii')
+
+    def sweep(self, start=None):
+        # Every (hash, count) from the first hash >= start to the end of the
+        # dump, in order, through a buffered sequential read rather than the
+        # map. Hashes come back as sweep_key() values.
+        offset = self.lower_bound(self.sweep_key(start)) if start else 0
+        with open(self.path, 'rb', buffering=1 << 20) as f:
+            advise_sequential(f, offset)
+            f.seek(offset)
+            for line in f:
+                digest, _, count = line.rstrip().partition(b':')
+                if digest:
+                    yield digest, int(count)
+
+    async def fetch(self, query_char):
+        return RangeTable.from_pairs(list(self.range_pairs(query_char)))
+
+    async def lookup(self, query_char, suffix):
+        return self.count(query_char + suffix)
+
+    def release(self):
+        self.mm.close()
+        self.file.close()
+
+    async def close(self):
+        self.release()
@@ -0,0 +1,142 @@
+import argparse
+import mmap
+import struct
+import sys
+from array import array
+
+from offline_dump import advise_sequential
+from range_table import RangeTable
+
+# Binary layout, all little-endian:
+#   header   8-byte magic + u64 record count
+#   fan-out  2^20 u32 entries; entry i is the number of records whose
+#            5-hex-char prefix is <= i, so prefix i spans [fanout[i-1], fanout[i])
+#   records  20-byte SHA-1 digest + u32 count, sorted by digest
+MAGIC = b'PWNIDX1\0'
+HEADER = struct.Struct('<8sQ')
+RECORD = struct.Struct('<20sI')
+FANOUT_SIZE = 1 << 20
+FANOUT_OFFSET = HEADER.size
+RECORDS_OFFSET = FANOUT_OFFSET + FANOUT_SIZE * 4
+SWEEP_RECORDS = 1 << 16
+
+
+class OfflineIndex:
+    # Lookups against an index written by build_index(). The fan-out table
+    # narrows every query to a single prefix's records, usually a few pages.
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.records = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a password index')
+
+    def bucket(self, prefix):
+        i = int(prefix, 16)
+        start = struct.unpack_from('<I', self.mm, FANOUT_OFFSET + (i - 1) * 4)[0] if i else 0
+        end = struct.unpack_from('<I', self.mm, FANOUT_OFFSET + i * 4)[0]
+        return start, end
+
+    def digest_at(self, i):
+        offset = RECORDS_OFFSET + i * RECORD.size
+        return self.mm[offset:offset + 20]
+
+    def range_pairs(self, prefix):
+        start, end = self.bucket(prefix)
+        for digest, count in RECORD.iter_unpack(self.mm[RECORDS_OFFSET + start * RECORD.size:
+                                                        RECORDS_OFFSET + end * RECORD.size]):
+            yield digest.hex()[5:].upper(), count
+
+    def count(self, sha1):
+        digest = bytes.fromhex(sha1)
+        lo, end = self.bucket(sha1[:5])
+        hi = end
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.digest_at(mid) < digest:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < end and self.digest_at(lo) == digest:
+            return RECORD.unpack_from(self.mm, RECORDS_OFFSET + lo * RECORD.size)[1]
+        return 0
+
+    def sweep_key(self, digest):
+        return bytes.fromhex(digest)
+
+    def sweep(self, start=None):
+        # Every (digest, count) from start's prefix to the end, in order,
+        # read in large sequential blocks
+        first = self.bucket(start[:5])[0] if start else 0
+        remaining = self.records - first
+        with open(self.path, 'rb') as f:
+            offset = RECORDS_OFFSET + first * RECORD.size
+            advise_sequential(f, offset)
+            f.seek(offset)
+            while remaining > 0:
+                count = min(remaining, SWEEP_RECORDS)
+                block = f.read(RECORD.size * count)
+                if len(block) != RECORD.size * count:
+                    raise ValueError(f'{self.path} is truncated')
+                remaining -= count
+                yield from RECORD.iter_unpack(block)
+
+    async def fetch(self, query_char):
+        return RangeTable.from_pairs(list(self.range_pairs(query_char)))
+
+    async def lookup(self, query_char, suffix):
+        return self.count(query_char + suffix)
+
+    async def close(self):
+        self.mm.close()
+        self.file.close()
+
+
+def build_index(source, target):
+    # Streams a sorted SHA1:count dump into the binary index format
+    fanout = array('I', bytes(4 * FANOUT_SIZE))
+    records = 0
+    previous = b''
+    with open(source, 'rb') as src, open(target, 'wb') as out:
+        out.seek(RECORDS_OFFSET)
+        for line in src:
+            line = line.strip()
+            if not line:
+                continue
+            sha1, _, count = line.partition(b':')
+            digest = bytes.fromhex(sha1.decode('ascii'))
+            if len(digest) != 20:
+                raise ValueError(f'{source} record {records + 1} is not a SHA-1 hash; '
+                                 f'only SHA-1 dumps can be indexed')
+            if digest <= previous:
+                raise ValueError(f'{source} is not sorted by hash at record {records + 1}')
+            previous = digest
+            out.write(RECORD.pack(digest, int(count)))
+            fanout[int.from_bytes(digest[:3], 'big') >> 4] += 1
+            records += 1
+        if records >= 1 << 32:
+            raise ValueError('too many records for a u32 fan-out table')
+        total = 0
+        for i in range(FANOUT_SIZE):
+            total += fanout[i]
+            fanout[i] = total
+        if sys.byteorder == 'big':
+            fanout.byteswap()
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, records))
+        out.write(fanout.tobytes())
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert a sorted SHA1:count dump into a compact binary index')
+    parser.add_argument('source', help='sorted Pwned Passwords SHA1:count text file')
+    parser.add_argument('target', help='index file to write')
+    args = parser.parse_args(argv)
+    records = build_index(args.source, args.target)
+    print(f'{records} RECORDS INDEXED')
+
+
+if __name__ == '__main__':
+    main()
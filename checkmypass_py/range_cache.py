@@ -0,0 +1,149 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import METRICS
+from range_table import RangeTable
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.checkmypass', 'ranges.db')
+
+
+class RangeCache:
+    # Ranges keyed by 5-char SHA-1 prefix: a small in-memory LRU of parsed
+    # tables in front of a SQLite store of raw bodies, both bounded and
+    # expired by the same TTL
+    def __init__(self, path=DEFAULT_PATH, ttl=7 * 24 * 3600, memory_size=1024, max_entries=100000):
+        self.path = path
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.puts = 0
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS ranges ('
+                        'prefix TEXT PRIMARY KEY, body TEXT NOT NULL, '
+                        'fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS ranges_accessed ON ranges (accessed_at)')
+        # Validators for conditional revalidation; added to older stores in place
+        columns = {row[1] for row in self.db.execute('PRAGMA table_info(ranges)')}
+        for column in ('etag', 'last_modified'):
+            if column not in columns:
+                self.db.execute(f'ALTER TABLE ranges ADD COLUMN {column} TEXT')
+
+    def is_fresh(self, fetched_at, now):
+        return self.ttl is None or now - fetched_at < self.ttl
+
+    def get(self, prefix, stale=False):
+        started = METRICS.clock()
+        table = self.read(prefix, stale)
+        METRICS.since('cache', started)
+        METRICS.incr('cache_hits' if table is not None else 'cache_misses')
+        return table
+
+    def read(self, prefix, stale=False):
+        # get() without the hit/miss accounting, for callers re-reading an
+        # entry whose lookup was already counted
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(prefix)
+            if entry is not None:
+                table, fetched_at = entry
+                if stale or self.is_fresh(fetched_at, now):
+                    self.memory.move_to_end(prefix)
+                    return table
+            row = self.db.execute('SELECT body, fetched_at FROM ranges WHERE prefix = ?',
+                                  (prefix,)).fetchone()
+            if row is None:
+                return None
+            body, fetched_at = row
+            if not stale and not self.is_fresh(fetched_at, now):
+                return None
+            self.db.execute('UPDATE ranges SET accessed_at = ? WHERE prefix = ?', (now, prefix))
+            table = RangeTable.parse(body)
+            self.remember(prefix, table, fetched_at)
+            return table
+
+    def put(self, prefix, table, body=None, etag=None, last_modified=None):
+        if body is None:
+            body = table.body()
+        now = time.time()
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO ranges '
+                            '(prefix, body, fetched_at, accessed_at, etag, last_modified) '
+                            'VALUES (?, ?, ?, ?, ?, ?)', (prefix, body, now, now, etag, last_modified))
+            self.remember(prefix, table, now)
+            self.puts += 1
+            if self.puts % 100 == 0:
+                self.trim()
+
+    def put_body(self, prefix, body, etag=None, last_modified=None):
+        # Disk-only write for bulk loaders such as the mirror, which have no
+        # use for a parsed copy in memory
+        now = time.time()
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO ranges '
+                            '(prefix, body, fetched_at, accessed_at, etag, last_modified) '
+                            'VALUES (?, ?, ?, ?, ?, ?)', (prefix, body, now, now, etag, last_modified))
+            self.memory.pop(prefix, None)
+
+    def validators(self, prefix):
+        # (etag, last_modified) of the stored copy, or None when there is none
+        with self.lock:
+            return self.db.execute('SELECT etag, last_modified FROM ranges WHERE prefix = ?',
+                                   (prefix,)).fetchone()
+
+    def touch(self, prefix):
+        # The upstream copy is unchanged (304): restart its TTL in place
+        now = time.time()
+        with self.lock:
+            self.db.execute('UPDATE ranges SET fetched_at = ?, accessed_at = ? WHERE prefix = ?',
+                            (now, now, prefix))
+            entry = self.memory.get(prefix)
+            if entry is not None:
+                self.memory[prefix] = (entry[0], now)
+
+    def get_body(self, prefix):
+        with self.lock:
+            row = self.db.execute('SELECT body FROM ranges WHERE prefix = ?', (prefix,)).fetchone()
+        return row[0] if row else None
+
+    def fresh_keys(self, max_age=None):
+        cutoff = 0 if max_age is None else time.time() - max_age
+        with self.lock:
+            return {row[0] for row in self.db.execute('SELECT prefix FROM ranges WHERE fetched_at >= ?',
+                                                      (cutoff,))}
+
+    def remember(self, prefix, table, fetched_at):
+        self.memory[prefix] = (table, fetched_at)
+        self.memory.move_to_end(prefix)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def trim(self):
+        # Drop the least recently used rows once the store grows past its cap
+        if self.max_entries is None:
+            return
+        count = self.db.execute('SELECT COUNT(*) FROM ranges').fetchone()[0]
+        if count > self.max_entries:
+            self.db.execute('DELETE FROM ranges WHERE prefix IN '
+                            '(SELECT prefix FROM ranges ORDER BY accessed_at LIMIT ?)',
+                            (count - self.max_entries,))
+
+    def purge_expired(self):
+        if self.ttl is None:
+            return
+        with self.lock:
+            self.db.execute('DELETE FROM ranges WHERE fetched_at < ?', (time.time() - self.ttl,))
+            self.memory.clear()
+
+    def close(self):
+        with self.lock:
+            self.trim()
+            self.db.close()
@@ -0,0 +1,182 @@
+import asyncio
+
+import aiohttp
+
+from metrics import METRICS
+from range_table import RangeTable
+from throttle import AdaptiveLimit, TokenBucket, backoff_delay, retry_after_delay
+
+API_URL = 'https://api.pwnedpasswords.com/range/'
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+THROTTLE_STATUSES = {429, 503}
+
+
+class RangeClient:
+    # One pooled session per app/engine, so repeated checks reuse the same
+    # keep-alive connections instead of paying a TCP + TLS handshake each time
+    def __init__(self, base_url=API_URL, limit=10, dns_ttl=300, keepalive_timeout=30, cache=None,
+                 timeout=10, retries=4, rate=None, mode='sha1', stream=True):
+        self.base_url = base_url
+        self.stream = stream
+        self.mode = mode
+        self.cache = cache
+        self.limit = limit
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self.retries = retries
+        self.bucket = TokenBucket(rate) if rate else None
+        self.concurrency = AdaptiveLimit(limit)
+        self.session = None
+        self.inflight = {}
+
+    def get_session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit,
+                                             ttl_dns_cache=self.dns_ttl,
+                                             keepalive_timeout=self.keepalive_timeout)
+            self.session = aiohttp.ClientSession(connector=connector,
+                                                 timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self.session
+
+    def cache_key(self, query_char):
+        return query_char if self.mode == 'sha1' else f'{self.mode}:{query_char}'
+
+    def url(self, query_char):
+        return f'{self.base_url}{query_char}' if self.mode == 'sha1' else f'{self.base_url}{query_char}?mode={self.mode}'
+
+    async def fetch(self, query_char):
+        if self.cache is not None:
+            table = self.cache.get(self.cache_key(query_char))
+            if table is not None:
+                return table
+        # Single flight: concurrent callers for the same prefix share one
+        # request. shield() keeps a cancelled caller from cancelling the rest.
+        task = self.inflight.get(query_char)
+        if task is None:
+            task = self.single_flight(query_char, self.load(query_char))
+        return await asyncio.shield(task)
+
+    def single_flight(self, query_char, coro):
+        task = asyncio.ensure_future(coro)
+        self.inflight[query_char] = task
+        task.add_done_callback(lambda t, q=query_char: self.forget(q, t))
+        return task
+
+    async def lookup(self, query_char, suffix):
+        # Without a cache there is nothing to keep the range for, so a single
+        # lookup is answered as soon as its line streams past. The download
+        # still runs to the end so its connection goes back to the pool, and
+        # callers arriving meanwhile share it through fetch().
+        if self.cache is not None or not self.stream or query_char in self.inflight:
+            table = await self.fetch(query_char)
+            return table.count(suffix)
+        found = asyncio.get_running_loop().create_future()
+        task = self.single_flight(query_char, self.download(query_char, lambda res: self.scan(res, suffix, found)))
+        # wait() rather than await, so a cancelled caller leaves the shared
+        # download running
+        await asyncio.wait((found, task), return_when=asyncio.FIRST_COMPLETED)
+        if found.done():
+            return found.result()
+        return task.result().count(suffix)
+
+    async def scan(self, res, suffix, found):
+        # Lines arrive sorted by suffix, so the first one at or past the
+        # target settles it; the rest are still read into the full table
+        target = suffix.encode('ascii')
+        pairs = []
+        async for line in res.content:
+            line, _, count = line.strip().partition(b':')
+            if not line:
+                continue
+            line, count = line.upper(), int(count or 0)
+            if not found.done() and line >= target:
+                found.set_result(count if line == target else 0)
+            pairs.append((line.decode('ascii'), count))
+        if not found.done():
+            found.set_result(0)
+        return RangeTable.from_pairs(pairs)
+
+    def forget(self, query_char, task):
+        self.inflight.pop(query_char, None)
+        if not task.cancelled():
+            task.exception()
+
+    async def load(self, query_char):
+        key = self.cache_key(query_char)
+        validators = self.cache.validators(key) if self.cache is not None else None
+        try:
+            status, body, etag, last_modified = await self.download_conditional(query_char, *(validators or ()))
+        except (aiohttp.ClientError, asyncio.TimeoutError, RuntimeError):
+            # Fall back to an expired copy rather than failing outright. The
+            # miss that led here is already counted, so read() rather than get().
+            table = self.cache.read(key, stale=True) if self.cache is not None else None
+            if table is None:
+                raise
+            METRICS.incr('stale_served')
+            return table
+        if status == 304:
+            table = self.cache.read(key, stale=True)
+            if table is not None:
+                self.cache.touch(key)
+                return table
+            status, body, etag, last_modified = await self.download_conditional(query_char)
+        table = RangeTable.parse(body)
+        if self.cache is not None:
+            self.cache.put(key, table, body, etag, last_modified)
+        return table
+
+    async def download_conditional(self, query_char, etag=None, last_modified=None):
+        # Revalidates a stored copy: returns (304, None, ...) when it is still
+        # current, otherwise (200, body, etag, last_modified)
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        async def read(res):
+            body = None if res.status == 304 else await res.text()
+            return res.status, body, res.headers.get('ETag'), res.headers.get('Last-Modified')
+
+        return await self.download(query_char, read, headers)
+
+    async def download(self, query_char, read=None, headers=None):
+        session = self.get_session()
+        for attempt in range(self.retries + 1):
+            if self.bucket is not None:
+                await self.bucket.acquire()
+            delay = None
+            async with self.concurrency:
+                started = METRICS.clock()
+                METRICS.incr('requests')
+                try:
+                    async with session.get(self.url(query_char), headers=headers) as res:
+                        if res.status == 200 or (res.status == 304 and headers):
+                            body = await (read(res) if read is not None else res.text())
+                            self.concurrency.on_success()
+                            METRICS.incr('bytes', res.content.total_bytes)
+                            METRICS.incr('not_modified' if res.status == 304 else 'downloads')
+                            return body
+                        error = RuntimeError(f'Error fetching: {res.status}')
+                        if res.status not in RETRY_STATUSES:
+                            raise error
+                        if res.status in THROTTLE_STATUSES:
+                            self.concurrency.on_throttle()
+                            METRICS.incr('throttled')
+                        delay = retry_after_delay(res.headers.get('Retry-After'))
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = e
+                finally:
+                    METRICS.since('request', started)
+            if attempt == self.retries:
+                raise error
+            METRICS.incr('retries')
+            await asyncio.sleep(delay if delay is not None else backoff_delay(attempt))
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        if self.cache is not None:
+            self.cache.close()
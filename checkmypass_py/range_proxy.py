@@ -0,0 +1,76 @@
+import argparse
+import re
+
+from aiohttp import web
+
+from backends import open_backend
+from metrics import METRICS
+
+PREFIX_RE = re.compile(r'^[0-9A-Fa-f]{5}$')
+MODES = ('sha1', 'ntlm')
+
+
+class RangeProxy:
+    # Serves GET /range/{prefix}[?mode=ntlm] in the upstream format from any
+    # backend. With the default online backend, misses fall through to the
+    # API and concurrent misses for one prefix share a single request.
+    # Point checkers at it with CHECKMYPASS_BACKEND=online:http://HOST:PORT/range/
+    def __init__(self, spec=None, limit=32):
+        self.spec = spec
+        self.limit = limit
+        self.backends = {}
+
+    def backend(self, mode):
+        if mode not in self.backends:
+            self.backends[mode] = open_backend(self.spec, limit=self.limit, mode=mode)
+        return self.backends[mode]
+
+    async def handle_range(self, request):
+        prefix = request.match_info['prefix']
+        if not PREFIX_RE.match(prefix):
+            return web.Response(status=400, text='The hash prefix was not in a valid format')
+        mode = request.query.get('mode', 'sha1')
+        if mode not in MODES:
+            return web.Response(status=400, text=f'Unknown mode: {mode}')
+        try:
+            table = await self.backend(mode).fetch(prefix.upper())
+        except ValueError as e:
+            return web.Response(status=400, text=str(e))
+        except Exception as e:
+            return web.Response(status=502, text=str(e))
+        return web.Response(text=table.body(), content_type='text/plain')
+
+    async def handle_metrics(self, request):
+        # Prometheus text exposition; empty unless metrics are enabled
+        if request.query.get('format') == 'json':
+            return web.Response(text=METRICS.to_json(), content_type='application/json')
+        return web.Response(text=METRICS.to_prometheus(), content_type='text/plain')
+
+    async def close(self, app=None):
+        for backend in self.backends.values():
+            await backend.close()
+        self.backends.clear()
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_get('/range/{prefix}', self.handle_range)
+        app.router.add_get('/metrics', self.handle_metrics)
+        app.on_cleanup.append(self.close)
+        return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve a Pwned Passwords compatible range API from the local cache')
+    parser.add_argument('--host', default='127.0.0.1', help='interface to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=8080, help='port to listen on (default: %(default)s)')
+    parser.add_argument('--backend', help='online[:URL], dump:PATH, index:PATH or mirror:PATH (default: $CHECKMYPASS_BACKEND or online)')
+    parser.add_argument('--concurrency', type=int, default=32, help='maximum upstream requests at once')
+    parser.add_argument('--metrics', action='store_true', help='record metrics and serve them on /metrics')
+    args = parser.parse_args(argv)
+    if args.metrics:
+        METRICS.enable()
+    web.run_app(RangeProxy(args.backend, args.concurrency).make_app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
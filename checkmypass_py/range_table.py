@@ -0,0 +1,64 @@
+from array import array
+
+from metrics import METRICS
+
+
+class RangeTable:
+    # A range body parsed once into a compact sorted form: every suffix packed
+    # end to end in one string (fixed width) and the counts in a parallel
+    # array, searched by bisection. Far smaller than a dict per cached range.
+    __slots__ = ('suffixes', 'counts', 'width')
+
+    def __init__(self, suffixes='', counts=None, width=0):
+        self.suffixes = suffixes
+        self.counts = counts if counts is not None else array('I')
+        self.width = width
+
+    @classmethod
+    def parse(cls, body):
+        started = METRICS.clock()
+        pairs = []
+        for line in body.splitlines():
+            suffix, _, count = line.partition(':')
+            if suffix:
+                pairs.append((suffix.upper(), int(count or 0)))
+        table = cls.from_pairs(pairs)
+        METRICS.since('parse', started)
+        return table
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        if any(pairs[i][0] > pairs[i + 1][0] for i in range(len(pairs) - 1)):
+            pairs = sorted(pairs)
+        if not pairs:
+            return cls()
+        return cls(''.join(suffix for suffix, _ in pairs),
+                   array('I', (count for _, count in pairs)),
+                   len(pairs[0][0]))
+
+    def __len__(self):
+        return len(self.counts)
+
+    def suffix_at(self, i):
+        return self.suffixes[i * self.width:(i + 1) * self.width]
+
+    def count(self, suffix):
+        if len(suffix) != self.width:
+            return 0
+        lo, hi = 0, len(self.counts)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.suffix_at(mid) < suffix:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.counts) and self.suffix_at(lo) == suffix:
+            return self.counts[lo]
+        return 0
+
+    def items(self):
+        for i, count in enumerate(self.counts):
+            yield self.suffix_at(i), count
+
+    def body(self):
+        return '\r\n'.join(f'{suffix}:{count}' for suffix, count in self.items())
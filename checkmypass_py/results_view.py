@@ -0,0 +1,69 @@
+import tkinter as tk
+from tkinter import ttk
+
+
+class ResultsView:
+    # A virtualized results pane: every row lives in a plain list, but the
+    # Text widget only ever holds the rows currently on screen, so redraws
+    # cost the same with ten results or ten hundred thousand
+    def __init__(self, master, width=50, height=10, **text_options):
+        self.height = height
+        self.rows = []
+        self.top = 0
+        self.follow = True
+        self.frame = ttk.Frame(master)
+        self.text = tk.Text(self.frame, width=width, height=height, wrap=tk.NONE, **text_options)
+        self.text.grid(row=0, column=0, sticky=(tk.N, tk.S, tk.E, tk.W))
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.on_scroll)
+        self.scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.text.bind('<MouseWheel>', lambda e: self.scroll_by(-1 if e.delta > 0 else 1, 'units'))
+        self.text.bind('<Button-4>', lambda e: self.scroll_by(-1, 'units'))
+        self.text.bind('<Button-5>', lambda e: self.scroll_by(1, 'units'))
+
+    def grid(self, **options):
+        self.frame.grid(**options)
+
+    def configure(self, **options):
+        self.text.configure(**options)
+
+    def append(self, text):
+        self.extend(text.split('\n'))
+
+    def extend(self, rows):
+        # Callers batch rows and render once per batch
+        self.rows.extend(rows)
+        if self.follow:
+            self.top = max(0, len(self.rows) - self.height)
+
+    def clear(self):
+        self.rows = []
+        self.top = 0
+        self.follow = True
+        self.render()
+
+    def render(self):
+        visible = self.rows[self.top:self.top + self.height]
+        self.text.delete('1.0', tk.END)
+        self.text.insert('1.0', '\n'.join(visible))
+        total = len(self.rows)
+        if total <= self.height:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.top / total, (self.top + self.height) / total)
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.scroll_to(int(float(amount) * len(self.rows)))
+        else:
+            self.scroll_by(int(amount), unit)
+        return 'break'
+
+    def scroll_by(self, amount, unit):
+        self.scroll_to(self.top + amount * (self.height if unit == 'pages' else 1))
+        return 'break'
+
+    def scroll_to(self, top):
+        last = max(0, len(self.rows) - self.height)
+        self.top = min(max(0, top), last)
+        self.follow = self.top == last
+        self.render()
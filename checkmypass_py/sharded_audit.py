@@ -0,0 +1,78 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+
+from bulk_audit import BATCH_SIZE, read_batches
+from offline_dump import OfflineDump
+from offline_index import OfflineIndex
+
+# The corpus each worker process has open, by (backend class, path): one
+# mapping and one file handle per worker however many shards it serves
+CORPORA = {}
+
+
+def check_shard(kind, path, entries):
+    # Runs in a worker: entries all share a shard's leading nibbles, so
+    # sorting them walks just that part of the corpus, in order
+    key = (kind, path)
+    if key not in CORPORA:
+        CORPORA[key] = kind(path)
+    corpus = CORPORA[key]
+    entries.sort(key=itemgetter(1))
+    return [(label, digest, corpus.count(digest)) for label, digest in entries]
+
+
+def can_shard(backend):
+    return isinstance(backend, (OfflineDump, OfflineIndex))
+
+
+async def sharded_audit(entries, backend, workers=None, nibbles=1, chunk_size=5000,
+                        batch_size=BATCH_SIZE):
+    # Spreads lookups against a local dump or index over a process pool.
+    # Entries are partitioned by the first `nibbles` hex digits of their
+    # hash and sent in chunks to whichever worker is free; each worker maps
+    # the corpus once, and a chunk only touches its shard's pages. Yields
+    # (label, hash, count) as chunks finish. Partly filled chunks wait in
+    # memory, up to 16**nibbles of them, so nibbles stays small.
+    workers = workers or os.cpu_count()
+    kind = type(backend)
+    loop = asyncio.get_running_loop()
+    buffers = {}
+    pending = set()
+    # spawn rather than fork: the GUI calls this with Tk and an event loop
+    # thread running
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def submit(shard):
+        pending.add(loop.run_in_executor(pool, check_shard, kind, backend.path, buffers.pop(shard)))
+
+    try:
+        async for batch in read_batches(entries, batch_size):
+            for label, digest in batch:
+                shard = digest[:nibbles].upper()
+                buffer = buffers.setdefault(shard, [])
+                buffer.append((label, digest))
+                if len(buffer) >= chunk_size:
+                    submit(shard)
+                    # Two chunks per worker keeps every core busy without
+                    # reading the whole input ahead of the lookups
+                    while len(pending) >= 2 * workers:
+                        done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for future in done:
+                            pending.discard(future)
+                            for result in future.result():
+                                yield result
+        for shard in list(buffers):
+            submit(shard)
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                for result in future.result():
+                    yield result
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=False, cancel_futures=True)